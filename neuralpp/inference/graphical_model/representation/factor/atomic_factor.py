@@ -3,8 +3,7 @@ from neuralpp.util import util
 
 
 class AtomicFactor(Factor):
-    def __init__(self, variables):
-        super().__init__(variables)
+    __slots__ = ()
 
     def atomic_factor(self):
         return self
@@ -16,3 +15,11 @@ class AtomicFactor(Factor):
 
     def sample_assignment_dict(self, n=1):
         return self.from_assignment_to_assignment_dict(self.sample(n))
+
+    def sample_assignment_dict_batch(self, n):
+        """
+        Returns a dict from each variable to the batch of its n sampled values,
+        i.e., one column of self.sample(n) per variable, instead of one assignment dict per sample.
+        """
+        samples = self.sample(n)
+        return {variable: samples[..., i] for i, variable in enumerate(self.variables)}
@@ -5,6 +5,9 @@ from neuralpp.util.group import Group
 
 
 class Factor:
+    # Subclasses that declare their own __slots__ have no per-instance __dict__.
+    __slots__ = ("variables",)
+
     def __init__(self, variables):
         self.variables = variables
 
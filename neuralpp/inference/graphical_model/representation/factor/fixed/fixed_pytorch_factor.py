@@ -4,6 +4,7 @@ from neuralpp.inference.graphical_model.representation.factor.pytorch_table_fact
 
 
 class FixedPyTorchTableFactor(PyTorchTableFactor):
+    __slots__ = ()
 
     # Main functionality: overriding pytorch_parameters so empty list so it does not get changed during training
 
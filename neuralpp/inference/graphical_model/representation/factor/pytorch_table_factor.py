@@ -11,6 +11,8 @@ from neuralpp.inference.graphical_model.representation.table.table_util import s
 
 
 class PyTorchTableFactor(TableFactor):
+    __slots__ = ()
+
     def __init__(
         self, variables, array_or_table_of_potentials, log_space=True, batch=False
     ):
@@ -20,6 +20,8 @@ class TableFactor(AtomicFactor):
     Like Table, a TableFactor may be a batch or not.
     """
 
+    __slots__ = ("table",)
+
     def __init__(self, variables, table):
         super().__init__(variables)
         self.table = table
@@ -1,22 +1,45 @@
 from __future__ import annotations
 
 import builtins
+import fractions
 import operator
+from functools import cached_property
+import sympy
+import z3
 from sympy import solve, oo
-from typing import Iterable, List, Set, Optional
+from typing import Dict, Iterable, List, Set, Optional
+from weakref import WeakValueDictionary
 from .expression import Variable, Expression, Context, Constant, FunctionApplication
 from .basic_expression import BasicExpression
-from .z3_expression import Z3SolverExpression
-from .sympy_interpreter import SymPyInterpreter
+from .z3_expression import Z3SolverExpression, Z3Expression
+from .sympy_interpreter import SymPyInterpreter, arithmetic_simplify
 from .sympy_expression import SymPyExpression
 from .constants import min_, max_
 from .profiler import Profiler
 
-_simplifier = SymPyInterpreter()
+# bounds only need arithmetic simplification, e.g., x + 1 + 1 to x + 2
+_simplifier = SymPyInterpreter(arithmetic_simplify)
 
 
 class ClosedInterval(BasicExpression):
-    """ [lower_bound, upper_bound] """
+    """
+    [lower_bound, upper_bound]
+    Intervals are interned: constructing an interval from the same bound objects returns the same instance.
+    """
+    _pool: WeakValueDictionary = WeakValueDictionary()
+
+    def __new__(cls, lower_bound, upper_bound):
+        # The pooled interval keeps its bounds alive, so their ids cannot be reused while the entry exists.
+        key = (id(lower_bound), id(upper_bound))
+        if (interval := cls._pool.get(key)) is None:
+            interval = super().__new__(cls)
+            cls._pool[key] = interval
+        return interval
+
+    def __getnewargs__(self):
+        # for copy and pickle, which would otherwise call __new__ without arguments
+        return self._lower_bound, self._upper_bound
+
     def __init__(self, lower_bound, upper_bound):
         if not isinstance(lower_bound, Expression):
             raise AttributeError(f"{lower_bound}")
@@ -25,6 +48,12 @@ class ClosedInterval(BasicExpression):
         super().__init__(Set)
         self._lower_bound = lower_bound
         self._upper_bound = upper_bound
+        # matched once here, so size and __iter__ do not pattern match on the bounds every time
+        match lower_bound, upper_bound:
+            case Constant(value=l, type=builtins.int), Constant(value=r, type=builtins.int):
+                self._integer_bounds = (l, r)
+            case _:
+                self._integer_bounds = None
 
     @property
     def lower_bound(self) -> Expression:
@@ -46,30 +75,45 @@ class ClosedInterval(BasicExpression):
         raise IndexError("out of scope.")
 
     def replace(self, from_expression: Expression, to_expression: Expression) -> Expression:
-        if self.syntactic_eq(from_expression):
+        if self.internal_object_eq(from_expression):
             return to_expression
-        return ClosedInterval(self.lower_bound.replace(from_expression, to_expression),
-                              self.upper_bound.replace(from_expression, to_expression))
+        if self._integer_bounds is not None and not isinstance(from_expression, Constant):
+            # constant bounds contain nothing but themselves
+            return self
+        new_subexpressions = _replace_in_subexpressions(self.subexpressions, from_expression, to_expression)
+        if new_subexpressions is None:
+            return self
+        return ClosedInterval(*new_subexpressions)
 
     def internal_object_eq(self, other) -> bool:
+        if self is other:
+            return True
         if not isinstance(other, ClosedInterval):
             return False
-        return self.lower_bound.internal_object_eq(other.lower_bound) and \
-            self.upper_bound.internal_object_eq(other.upper_bound)
+        if self._integer_bounds is not None and other._integer_bounds is not None:
+            # equal constants from different backends are not internally equal
+            return self._integer_bounds == other._integer_bounds and \
+                type(self.lower_bound) is type(other.lower_bound) and \
+                type(self.upper_bound) is type(other.upper_bound)
+        return _subexpressions_internal_object_eq(self.subexpressions, other.subexpressions)
 
     def __iter__(self) -> Iterable[int]:
         """
-        If upper and lower bounds are constant, return a range that's iterable.
+        If upper and lower bounds are constant, return a range over the interval, both bounds included.
         Otherwise, raise TypeError
         """
-        match self.lower_bound, self.upper_bound:
-            case Constant(value=l, type=builtins.int), Constant(value=r, type=builtins.int):
-                return iter(range(l, r))
-            case _:
-                raise TypeError("Lower and upper bounds must both be Constants!")
+        if self._integer_bounds is None:
+            raise TypeError("Lower and upper bounds must both be Constants!")
+        l, r = self._integer_bounds
+        return iter(range(l, r + 1))
 
-    @property
+    @cached_property
     def size(self) -> Expression:
+        if self._integer_bounds is not None:
+            l, r = self._integer_bounds
+            if l > r:
+                raise AttributeError(f'[{self.lower_bound},{self.upper_bound}] is an empty interval.')
+            return self.lower_bound.new_constant(r - l + 1, builtins.int)
         if self.lower_bound > self.upper_bound:
             raise AttributeError(f'[{self.lower_bound},{self.upper_bound}] is an empty interval.')
         return self.upper_bound - self.lower_bound + 1
@@ -79,16 +123,38 @@ class ClosedInterval(BasicExpression):
             raise AttributeError("lower bound is None")
         if self.upper_bound is None:
             raise AttributeError("upper bound is None")
-        result = Z3SolverExpression() & (index >= self.lower_bound) & (index <= self.upper_bound)
+        # Add both inequalities to one solver directly, instead of conjoining them one at a time
+        # (each conjunction copies the solver and checks its satisfiability).
+        z3_index, z3_lower_bound, z3_upper_bound = \
+            (Z3Expression.convert(expression).z3_object for expression in (index, self.lower_bound, self.upper_bound))
+        solver = z3.Solver()
+        solver.add(z3_index >= z3_lower_bound, z3_index <= z3_upper_bound)
+        result = Z3SolverExpression.make(solver, {})  # inequalities give no variable-to-value pairs
         assert isinstance(result, Context)  # otherwise lower_bound <= upper_bound is unsatisfiable
         return result
 
 
 class DottedIntervals(BasicExpression):
+    """
+    Dotted intervals are interned like ClosedInterval, by the ids of the interval and the dots.
+    """
+    _pool: WeakValueDictionary = WeakValueDictionary()
+
+    def __new__(cls, interval: ClosedInterval, dots: List[Expression]):
+        key = (id(interval), *map(id, dots))
+        if (dotted_intervals := cls._pool.get(key)) is None:
+            dotted_intervals = super().__new__(cls)
+            cls._pool[key] = dotted_intervals
+        return dotted_intervals
+
+    def __getnewargs__(self):
+        return self._interval, self._dots
+
     def __init__(self, interval: ClosedInterval, dots: List[Expression]):
         super().__init__(Set)
         self._interval = interval
-        self._dots = dots
+        # a tuple, since a pooled instance is shared by everyone constructing it from the same objects
+        self._dots = tuple(dots)
 
     @property
     def interval(self) -> ClosedInterval:
@@ -96,29 +162,78 @@ class DottedIntervals(BasicExpression):
 
     @property
     def dots(self) -> List[Expression]:
-        return self._dots
+        return list(self._dots)
 
     @property
     def subexpressions(self) -> List[Expression]:
-        return [self.interval] + self.dots
+        return [self.interval, *self._dots]
 
     def set(self, i: int, new_expression: Expression) -> Expression:
         raise NotImplementedError("TODO")
 
     def replace(self, from_expression: Expression, to_expression: Expression) -> Expression:
-        raise NotImplementedError("TODO")
+        if self.internal_object_eq(from_expression):
+            return to_expression
+        new_subexpressions = _replace_in_subexpressions(self.subexpressions, from_expression, to_expression)
+        if new_subexpressions is None:
+            return self
+        return DottedIntervals(new_subexpressions[0], new_subexpressions[1:])
 
     def internal_object_eq(self, other) -> bool:
-        raise NotImplementedError("TODO")
+        if self is other:
+            return True
+        if not isinstance(other, DottedIntervals):
+            return False
+        return _subexpressions_internal_object_eq(self.subexpressions, other.subexpressions)
 
     @property
     def __iter__(self) -> Iterable[int]:
         raise NotImplementedError("TODO")
 
 
-def _adjust(expression: Expression, variable: Variable) -> Expression:
+def _replace_in_subexpressions(subexpressions: List[Expression],
+                               from_expression: Expression, to_expression: Expression) -> Optional[List[Expression]]:
+    """
+    Replaces in each subexpression with a single sequential pass over the list.
+    Expressions are immutable, so a subexpression shared by several positions (e.g., [x, x]) is replaced only once.
+    Returns None if no subexpression changed, so the caller can return itself (see Expression.replace()).
+    """
+    changed = False
+    replaced = {}
+    new_subexpressions = []
+    for subexpression in subexpressions:
+        if (new_subexpression := replaced.get(id(subexpression))) is None:
+            new_subexpression = subexpression.replace(from_expression, to_expression)
+            replaced[id(subexpression)] = new_subexpression
+        changed = changed or new_subexpression is not subexpression
+        new_subexpressions.append(new_subexpression)
+    return new_subexpressions if changed else None
+
+
+def _subexpressions_internal_object_eq(subexpressions: List[Expression], other_subexpressions: List[Expression]) \
+        -> bool:
+    if len(subexpressions) != len(other_subexpressions):
+        return False
+    for subexpression, other_subexpression in zip(subexpressions, other_subexpressions):
+        if subexpression is not other_subexpression and not subexpression.internal_object_eq(other_subexpression):
+            return False
+    return True
+
+
+def _is_solved_for(relation: sympy.Basic, sympy_var: sympy.Symbol) -> bool:
+    """ Whether `relation` is already of the form `var op bound` or `bound op var`, with `bound` free of `var`. """
+    if not relation.is_Relational:
+        return False
+    lhs, rhs = relation.args
+    return (lhs == sympy_var and not rhs.has(sympy_var)) or (rhs == sympy_var and not lhs.has(sympy_var))
+
+
+def _adjust(expression: Expression, sympy_var: sympy.Symbol) -> Expression:
     sympy_expression = SymPyExpression.convert(expression)
-    sympy_var = SymPyExpression.convert(variable).sympy_object
+    if _is_solved_for(sympy_expression.sympy_object, sympy_var):
+        # No need to run SymPy's inequality solver, which dominates the cost of extracting a bound.
+        # doit() still evaluates the bound (converted expressions are unevaluated), as solve() would.
+        return SymPyExpression.from_sympy_object(sympy_expression.sympy_object.doit(), sympy_expression.type_dict)
     answer = solve(sympy_expression.sympy_object, sympy_var)
     if len(answer.args) > 2:
         raise AttributeError("?")
@@ -132,6 +247,22 @@ def _adjust(expression: Expression, variable: Variable) -> Expression:
     return SymPyExpression.from_sympy_object(answer, sympy_expression.type_dict)
 
 
+_Number = int | float | fractions.Fraction
+
+
+def _numeric_value(bound: Expression | _Number) -> Optional[_Number]:
+    """ Returns the number a bound stands for if it is numeric (either a raw number or a numeric Constant). """
+    match bound:
+        case bool() | Constant(value=bool()):
+            return None
+        case int() | float() | fractions.Fraction():
+            return bound
+        case Constant(value=int() | float() | fractions.Fraction() as value):
+            return value
+        case _:
+            return None
+
+
 class MagicInterval:
     """
     One interval, but with non-deterministic lower/upperbounds, for example,
@@ -140,29 +271,50 @@ class MagicInterval:
     [y,z] if x <= y and z > y
     [x,y] if x > y and z >= y
     [y,y] if x <= y and z <= y
+
+    Bounds are keyed by their SymPy object, so a bound that is added twice (e.g., from x >= 1 and x > 0)
+    only appears once in the resulting max/min.
+    Numeric bounds are folded into a single lower (upper) bound with plain Python comparisons,
+    starting from -inf (+inf), so only symbolic bounds end up in the max/min.
     """
     def __init__(self):
-        self._lower_bounds = []
-        self._upper_bounds = []
+        self._lower_bounds: Dict[sympy.Basic, Expression] = {}
+        self._upper_bounds: Dict[sympy.Basic, Expression] = {}
+        self._numeric_lower_bound = float('-inf')
+        self._numeric_upper_bound = float('inf')
 
     @property
-    def lower_bounds(self):
-        return self._lower_bounds
+    def lower_bounds(self) -> List[Expression]:
+        result = list(self._lower_bounds.values())
+        if self._numeric_lower_bound != float('-inf'):
+            result.append(SymPyExpression.new_constant(self._numeric_lower_bound))
+        return result
 
     @property
-    def upper_bounds(self):
-        return self._upper_bounds
+    def upper_bounds(self) -> List[Expression]:
+        result = list(self._upper_bounds.values())
+        if self._numeric_upper_bound != float('inf'):
+            result.append(SymPyExpression.new_constant(self._numeric_upper_bound))
+        return result
 
-    def add_lower_bound(self, lower_bound: Expression):
-        self._lower_bounds.append(lower_bound)
+    def add_lower_bound(self, lower_bound: Expression | _Number):
+        if (value := _numeric_value(lower_bound)) is not None:
+            if value > self._numeric_lower_bound:
+                self._numeric_lower_bound = value
+        else:
+            self._lower_bounds.setdefault(SymPyExpression.convert(lower_bound).sympy_object, lower_bound)
 
-    def add_upper_bound(self, upper_bound: Expression):
-        self._upper_bounds.append(upper_bound)
+    def add_upper_bound(self, upper_bound: Expression | _Number):
+        if (value := _numeric_value(upper_bound)) is not None:
+            if value < self._numeric_upper_bound:
+                self._numeric_upper_bound = value
+        else:
+            self._upper_bounds.setdefault(SymPyExpression.convert(upper_bound).sympy_object, upper_bound)
 
     def to_conditional_intervals(self, context: Z3SolverExpression) -> Expression:
         if len(self.lower_bounds) < 1 or len(self.upper_bounds) < 1:
             raise AttributeError(f"bounds not set. {self.lower_bounds} {self.upper_bounds}")
-        return DottedIntervals(ClosedInterval(max_(self._lower_bounds),
+        return DottedIntervals(ClosedInterval(max_(self.lower_bounds),
                                               min_(self.upper_bounds)), [])
 
 
@@ -192,14 +344,25 @@ def from_constraint(index: Variable, constraint: Context, context: Context, is_i
         case FunctionApplication(function=Constant(value=operator.and_), arguments=arguments):
             with profiler.profile_section("compute magic interval"):
                 magic_interval = MagicInterval()
+                sympy_index = SymPyExpression.convert(index).sympy_object
                 for argument in arguments:
-                    argument = _adjust(argument, index)
+                    argument = _adjust(argument, sympy_index)
                     _extract_bound_from_constraint(index, argument, magic_interval, is_integral)
                 return magic_interval.to_conditional_intervals(context)
         case _:
             raise NotImplementedError("Constraint should be AND of constraints")
 
 
+# (inequality, position of the index in the inequality) -> (0 for lower bound or 1 for upper bound,
+# adjustment to the bound for strict inequalities when not integrating). E.g., x > 5 gives a lower bound 5 + 1.
+_BOUND_TABLE = {
+    (operator.ge, 1): (0, 0), (operator.ge, 2): (1, 0),
+    (operator.le, 1): (1, 0), (operator.le, 2): (0, 0),
+    (operator.gt, 1): (0, +1), (operator.gt, 2): (1, -1),
+    (operator.lt, 1): (1, -1), (operator.lt, 2): (0, +1),
+}
+
+
 def _extract_bound_from_constraint(
     index: Variable,
     constraint: Expression,
@@ -221,61 +384,41 @@ def _extract_bound_from_constraint(
     Sets the possible bound if it's greater than the current lower or less than the current upper by passing
     it into _check_and_set_bounds
     """
-    possible_inequality = constraint.subexpressions[0].value
+    # subexpressions is rebuilt (and its elements converted) on each access, so read it once
+    inequality, lhs, rhs = constraint.subexpressions
+    possible_inequality = inequality.value
 
     variable_index = None
     bound = None
-    if constraint.subexpressions[1].syntactic_eq(index):
+    if lhs.syntactic_eq(index):
         variable_index = 1
-        bound = constraint.subexpressions[2]
-    elif constraint.subexpressions[2].syntactic_eq(index):
+        bound = rhs
+    elif rhs.syntactic_eq(index):
         variable_index = 2
-        bound = constraint.subexpressions[1]
+        bound = lhs
     else:
         raise ValueError(f"intervals is not yet ready to handle more complicated cases {constraint} {index}")
 
-    match possible_inequality:
-        case operator.ge:
-            if variable_index == 1:
-                _check_and_set_bounds(0, bound, magic_interval)
-            elif variable_index == 2:
-                _check_and_set_bounds(1, bound, magic_interval)
-        case operator.le:
-            if variable_index == 1:
-                _check_and_set_bounds(1, bound, magic_interval)
-            elif variable_index == 2:
-                _check_and_set_bounds(0, bound, magic_interval)
-        case operator.gt:
-            if variable_index == 1:
-                if not is_integral:
-                    bound = _simplifier.simplify(bound + 1)
-                _check_and_set_bounds(0, bound, magic_interval)
-            elif variable_index == 2:
-                if not is_integral:
-                    bound = _simplifier.simplify(bound - 1)
-                _check_and_set_bounds(1, bound, magic_interval)
-        case operator.lt:
-            if variable_index == 1:
-                if not is_integral:
-                    bound = _simplifier.simplify(bound - 1)
-                _check_and_set_bounds(1, bound, magic_interval)
-            elif variable_index == 2:
-                if not is_integral:
-                    bound = _simplifier.simplify(bound + 1)
-                _check_and_set_bounds(0, bound, magic_interval)
-        case _:
-            raise ValueError(f"interval doesn't support {possible_inequality} yet")
+    if (bound_index_and_delta := _BOUND_TABLE.get((possible_inequality, variable_index))) is None:
+        raise ValueError(f"interval doesn't support {possible_inequality} yet")
+    bound_index, delta = bound_index_and_delta
+    if (value := _numeric_value(bound)) is not None:
+        # plain Python arithmetic; MagicInterval only builds a Constant for the final numeric bound
+        bound = value if is_integral else value + delta
+    elif delta and not is_integral:
+        bound = _simplifier.simplify(bound + delta)
+    _check_and_set_bounds(bound_index, bound, magic_interval)
     return magic_interval
 
 
 def _check_and_set_bounds(
     index: int,
-    bound: Expression,
+    bound: Expression | _Number,
     magic_interval: MagicInterval
 ):
     """
     @param index: indicates which bound we are checking => 0 is lower bound and 1 is upper bound
-    @param bound: the Constant of the bound (the value inside will be an int)
+    @param bound: the bound, either an Expression or a number
     @param closed_interval: the current ClosedInterval we have
     @exceptions: a list of exceptions
     @return: a tuple of the new closed_interval and list of exceptions
@@ -1,6 +1,8 @@
-from typing import Dict
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional, Tuple
 
 import sympy
+from sympy.core.function import AppliedUndef
 
 from neuralpp.symbolic.basic_expression import TrueContext
 from neuralpp.symbolic.expression import Expression, Context
@@ -13,17 +15,76 @@ from neuralpp.util.symbolic_error_util import ConversionError
 from neuralpp.util.sympy_util import is_sympy_value
 
 
+SimplifyStrategy = Callable[[sympy.Basic], sympy.Basic]
+
+
+def arithmetic_simplify(expression: sympy.Basic) -> sympy.Basic:
+    """
+    A much cheaper alternative to sympy.simplify(), which tries many rewritings (trigsimp, powsimp, radsimp, ...)
+    and keeps the best one. Evaluating and cancelling is enough for polynomial and rational arithmetic,
+    such as the bounds of intervals.
+    """
+    return sympy.cancel(expression.doit())
+
+
+@lru_cache(maxsize=4096)
+def _cached_simplify(expression: sympy.Basic, simplify_strategy: SimplifyStrategy) -> sympy.Basic:
+    """
+    SymPy objects are immutable and hashed structurally, and simplification is pure,
+    so the same expression showing up again (common in fixpoint-style elimination) is a cache hit.
+    """
+    return simplify_strategy(expression)
+
+
+@lru_cache(maxsize=4096)
+def _compile(expression: sympy.Basic) -> Optional[Tuple[Tuple[sympy.Symbol, ...], Callable]]:
+    """
+    Returns the free symbols of `expression` (in a fixed order) and a Python function of these symbols
+    computing `expression`, or None if `expression` cannot be compiled: it has uninterpreted functions,
+    non-integer numbers, or divisions (powers whose exponent is not a non-negative integer; x/y is x*y**-1),
+    all of which the compiled function would compute with floats instead of exact rationals.
+    """
+    if expression.atoms(AppliedUndef):
+        return None
+    if any(not number.is_Integer for number in expression.atoms(sympy.Number)):
+        return None
+    if any(not (power.exp.is_Integer and power.exp >= 0) for power in expression.atoms(sympy.Pow)):
+        return None
+    symbols = tuple(sorted(expression.free_symbols, key=str))
+    return symbols, sympy.lambdify(symbols, expression, modules="math")
+
+
+def _to_python_value(value: Any) -> Optional[int | bool]:
+    """ Returns `value` as a Python int or bool, or None if it is neither (e.g., a rational). """
+    value = sympy.sympify(value)
+    if value.is_Integer:
+        return int(value)
+    if isinstance(value, sympy.logic.boolalg.BooleanAtom):
+        return bool(value)
+    return None
+
+
 class SymPyInterpreter(Interpreter, Simplifier):
+    def __init__(self, simplify_strategy: SimplifyStrategy = sympy.simplify):
+        """
+        @param simplify_strategy: the SymPy transformation used to simplify expressions when there is no context.
+        Callers that only need arithmetic simplification can pass `arithmetic_simplify`.
+        """
+        self._simplify_strategy = simplify_strategy
+
     @staticmethod
-    def _simplify_expression(expression: sympy.Basic, context: Context) -> sympy.Basic:
+    def _simplify_expression(expression: sympy.Basic, context: Context,
+                             simplify_strategy: SimplifyStrategy = sympy.simplify) -> sympy.Basic:
         result = expression
         if not context.dict:
             # in creation of function application, we set evaluate=False, so 1 + 2 will not evaluate
             # call simplify() evaluates that
-            result = result.simplify()
+            result = _cached_simplify(result, simplify_strategy)
         else:
-            for variable, value in context.dict.items():
-                result = result.replace(sympy.symbols(variable), sympy.sympify(value))
+            # one structural pass substituting all variables at once (no pattern matching as in replace())
+            result = result.xreplace(
+                {sympy.Symbol(variable): sympy.sympify(value) for variable, value in context.dict.items()}
+            )
         return result
 
     def eval(self, expression: SymPyExpression, context: Context = TrueContext()):
@@ -32,7 +93,7 @@ class SymPyInterpreter(Interpreter, Simplifier):
         If the `context` is not empty, `eval()` will replace all the variables within the context with
         its corresponding value. `eval()` will also simplify the corresponding value for the variable.
         """
-        result = SymPyInterpreter._simplify_expression(expression.sympy_object, context)
+        result = SymPyInterpreter._simplify_expression(expression.sympy_object, context, self._simplify_strategy)
         if is_sympy_value(result):
             return result
         else:
@@ -48,11 +109,13 @@ class SymPyInterpreter(Interpreter, Simplifier):
         Assumes all variables (including uninterpreted functions) used in sympy_object is in type_dict.
         Returns a new type dict that only contains the keys that's used in sympy_object.
         """
-        result = {}
-        for key, value in type_dict.items():
-            if sympy_object.has(key):
-                result[key] = value
-        return result
+        # collect all used symbols (including bound ones, e.g., the index of a Sum) and uninterpreted functions
+        # in a single traversal, instead of calling sympy_object.has(key) for each key.
+        used = {
+            atom.func if isinstance(atom, AppliedUndef) else atom
+            for atom in sympy_object.atoms(sympy.Symbol, AppliedUndef)
+        }
+        return {key: value for key, value in type_dict.items() if key in used}
 
     def simplify(
         self, expression: Expression, context: Context = TrueContext()
@@ -70,7 +133,7 @@ class SymPyInterpreter(Interpreter, Simplifier):
                     raise ConversionError() from exc
 
             simplified_sympy_expression = SymPyInterpreter._simplify_expression(
-                expression.sympy_object, context
+                expression.sympy_object, context, self._simplify_strategy
             )
             if expression.type == bool:
                 simplified_sympy_expression = sympy.to_dnf(simplified_sympy_expression)
@@ -84,3 +147,38 @@ class SymPyInterpreter(Interpreter, Simplifier):
             )
             assert result_expression is not None
             return result_expression
+
+
+class CompiledSymPyInterpreter(SymPyInterpreter):
+    """
+    A SymPyInterpreter that compiles an expression into a Python function once (with sympy.lambdify)
+    and, when `context` binds all free variables of the expression, calls that function instead of
+    substituting values into the SymPy tree.
+    The compiled function is only used on integer and boolean values, where Python arithmetic is exact;
+    anything else (rational values, divisions, arithmetic errors) falls back to SymPyInterpreter.eval().
+    """
+
+    def eval(self, expression: SymPyExpression, context: Context = TrueContext()):
+        if (result := self._eval_compiled(expression, context)) is not None:
+            return result
+        return super().eval(expression, context)
+
+    @staticmethod
+    def _eval_compiled(expression: SymPyExpression, context: Context) -> Optional[sympy.Basic]:
+        # checked before compiling, so that partial contexts do not pay for lambdify only to fall back
+        if not all(str(symbol) in context.dict for symbol in expression.sympy_object.free_symbols):
+            return None
+        compiled = _compile(expression.sympy_object)
+        if compiled is None:
+            return None
+        symbols, function = compiled
+        arguments = [_to_python_value(context.dict[str(symbol)]) for symbol in symbols]
+        if any(argument is None for argument in arguments):
+            return None
+        try:
+            result = function(*arguments)
+        except ArithmeticError:
+            return None
+        if not isinstance(result, int):  # e.g., true division produced a float (bool is an int)
+            return None
+        return sympy.sympify(result)
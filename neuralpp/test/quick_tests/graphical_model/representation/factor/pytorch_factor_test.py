@@ -3,6 +3,9 @@ import random
 import pytest
 import torch
 
+from neuralpp.inference.graphical_model.representation.factor.fixed.fixed_pytorch_factor import (
+    FixedPyTorchTableFactor,
+)
 from neuralpp.inference.graphical_model.representation.factor.pytorch_table_factor import (
     PyTorchTableFactor,
 )
@@ -74,6 +77,26 @@ def test_sample(normalized_product_factor):
     assert all((torch.equal(a, e) for a, e in zip(actual, expected)))
 
 
+def test_sample_assignment_dict_batch(x, y, normalized_product_factor):
+    torch.manual_seed(2)
+    samples = normalized_product_factor.sample(20)
+    torch.manual_seed(2)
+    assignment_dict_batch = normalized_product_factor.sample_assignment_dict_batch(20)
+    assert list(assignment_dict_batch) == normalized_product_factor.variables
+    for i, variable in enumerate(normalized_product_factor.variables):
+        assert torch.equal(assignment_dict_batch[variable], samples[:, i])
+    assert all(0 <= value < 3 for value in assignment_dict_batch[x])
+    assert all(0 <= value < 2 for value in assignment_dict_batch[y])
+
+
+def test_table_factors_have_no_instance_dict(x, y, factor1):
+    assert not hasattr(factor1, "__dict__")
+    assert not hasattr(FixedPyTorchTableFactor([x, y], [[0.1, 0.9], [0.5, 0.5], [0.3, 0.7]]), "__dict__")
+    # operations produce table factors of the same class
+    assert not hasattr(factor1.condition({x: 0}), "__dict__")
+    assert not hasattr(factor1.normalize(), "__dict__")
+
+
 def test_normalization(x, y, factor1, factor2):
     product = factor1 * factor2
     print("Product:", product)
@@ -12,7 +12,7 @@ from neuralpp.symbolic.basic_interpreter import BasicInterpreter
 from neuralpp.util.symbolic_error_util import UnknownError
 from neuralpp.symbolic.sympy_expression import SymPyVariable, SymPyConstant, SymPyFunctionApplication, \
     SymPyExpression, SymPyContext
-from neuralpp.symbolic.sympy_interpreter import SymPyInterpreter
+from neuralpp.symbolic.sympy_interpreter import SymPyInterpreter, CompiledSymPyInterpreter, arithmetic_simplify
 from neuralpp.symbolic.z3_expression import Z3FunctionApplication
 from neuralpp.symbolic.functions import conditional
 from neuralpp.util.callable_util import boolean_function_of_arity
@@ -151,6 +151,50 @@ def test_sympy_interpreter():
     assert si.eval(min_of_three_five, dict_to_sympy_context(dict1)) == 3
 
 
+def test_compiled_sympy_interpreter():
+    si = CompiledSymPyInterpreter()
+    x, y, z = sympy.symbols("x y z")
+    one = SymPyConstant(sympy.Integer(1))
+    assert si.eval(one) == 1
+
+    dict2 = {"x": 3, "y": 5, "z": 100}
+    x_times_y_plus_z = SymPyFunctionApplication(x * y + z, {x: int, y: int, z: int})
+    assert si.eval(x_times_y_plus_z, dict_to_sympy_context(dict2)) == 115
+    # compiled once, reused for other values
+    dict3 = {"x": 2, "y": 2, "z": 1}
+    assert si.eval(x_times_y_plus_z, dict_to_sympy_context(dict3)) == 5
+
+    piecewise = SymPyFunctionApplication(sympy.Piecewise((x * 100, x <= 2), (y, True)), {x: int, y: int})
+    assert si.eval(piecewise, dict_to_sympy_context({"x": 2, "y": 2})) == 200
+    assert si.eval(piecewise, dict_to_sympy_context({"x": 3, "y": 2})) == 2
+
+    # falls back to SymPyInterpreter when not all variables are bound
+    with pytest.raises(RuntimeError):
+        si.eval(x_times_y_plus_z, dict_to_sympy_context({"x": 3, "y": 5}))
+
+    # rational values are evaluated exactly (by falling back to SymPyInterpreter), not with floats
+    x_plus_y_is_three_tenths = SymPyFunctionApplication(sympy.Eq(x + y, sympy.Rational(3, 10)), {x: int, y: int})
+    rational_context = SymPyContext(sympy.And(sympy.Eq(x, sympy.Rational(1, 10), evaluate=False),
+                                              sympy.Eq(y, sympy.Rational(2, 10), evaluate=False), evaluate=False),
+                                    {x: fractions.Fraction, y: fractions.Fraction})
+    assert SymPyInterpreter().eval(x_plus_y_is_three_tenths, rational_context)
+    assert si.eval(x_plus_y_is_three_tenths, rational_context)
+    x_over_y = SymPyFunctionApplication(x / y, {x: int, y: int})
+    assert si.eval(x_over_y, dict_to_sympy_context({"x": 1, "y": 2})) == sympy.Rational(1, 2)
+
+    # division by zero behaves as in SymPyInterpreter
+    with pytest.raises(RuntimeError):
+        SymPyInterpreter().eval(x_over_y, dict_to_sympy_context({"x": 1, "y": 0}))
+    with pytest.raises(RuntimeError):
+        si.eval(x_over_y, dict_to_sympy_context({"x": 1, "y": 0}))
+
+    # a division inside a relation is not computed with floats either (x/y would round to exactly 2.0)
+    x_over_y_is_z = SymPyFunctionApplication(sympy.Eq(x / y, z), {x: int, y: int, z: int})
+    big_int_context = dict_to_sympy_context({"x": 2 * 10 ** 17 + 1, "y": 10 ** 17, "z": 2})
+    assert not SymPyInterpreter().eval(x_over_y_is_z, big_int_context)
+    assert not si.eval(x_over_y_is_z, big_int_context)
+
+
 def test_sympy_interpreter_simplify():
     si = SymPyInterpreter()
     x, y = sympy.symbols("x y")
@@ -269,3 +313,39 @@ def test_sympy_context():
     assert not unknown_context.satisfiability_is_known
     with pytest.raises(UnknownError):
         unknown_context.unsatisfiable
+
+
+def test_sympy_interpreter_simplify_is_cached():
+    from neuralpp.symbolic.sympy_interpreter import _cached_simplify
+    si = SymPyInterpreter()
+    x, y = sympy.symbols("x y")
+    x_plus_y_minus_y = SymPyFunctionApplication(sympy.Add(x + y, -y, evaluate=False), {x: int, y: int})
+
+    first = si.simplify(x_plus_y_minus_y)
+    hits = _cached_simplify.cache_info().hits
+    second = si.simplify(x_plus_y_minus_y)
+    assert _cached_simplify.cache_info().hits == hits + 1
+    assert first.internal_object_eq(second)
+    assert second.internal_object_eq(SymPyVariable(x, int))
+
+
+def test_purge_type_dict():
+    x, y, z, i, n = sympy.symbols("x y z i n")
+    f = sympy.Function("f")
+    type_dict = {x: int, y: int, z: int, i: int, n: int, f: Callable[[int], int]}
+
+    assert SymPyInterpreter.purge_type_dict(type_dict, x + 1) == {x: int}
+    assert SymPyInterpreter.purge_type_dict(type_dict, f(y) * x) == {x: int, y: int, f: Callable[[int], int]}
+    # bound variables are kept
+    assert SymPyInterpreter.purge_type_dict(type_dict, sympy.Sum(i, (i, 0, n))) == {i: int, n: int}
+    assert SymPyInterpreter.purge_type_dict(type_dict, sympy.Integer(3)) == {}
+
+
+def test_sympy_interpreter_simplify_strategy():
+    si = SymPyInterpreter(arithmetic_simplify)
+    x, y = sympy.symbols("x y")
+    x_plus_one_plus_one = SymPyFunctionApplication(sympy.Add(x + 1, 1, evaluate=False), {x: int})
+    assert si.simplify(x_plus_one_plus_one).sympy_object == x + 2
+
+    x_plus_y_minus_y = SymPyFunctionApplication(sympy.Add(x + y, -y, evaluate=False), {x: int, y: int})
+    assert si.simplify(x_plus_y_minus_y).internal_object_eq(SymPyVariable(x, int))
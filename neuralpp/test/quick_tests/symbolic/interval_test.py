@@ -1,7 +1,14 @@
-from neuralpp.symbolic.interval import from_constraint
+import copy
+import pickle
+
+import pytest
+
+from neuralpp.symbolic.interval import from_constraint, ClosedInterval, DottedIntervals
 from neuralpp.symbolic.z3_expression import Z3SolverExpression, Z3Expression
+from neuralpp.symbolic.sympy_expression import SymPyExpression
 from neuralpp.symbolic.basic_expression import BasicVariable
 from neuralpp.symbolic.expression import FunctionApplication
+from neuralpp.symbolic.constants import min_
 
 
 def test_basic_constant_closed_intervals():
@@ -38,3 +45,153 @@ def test_basic_symbolic_closed_intervals():
 
     assert interval.lower_bound.syntactic_eq(3 + x)
     assert interval.upper_bound.syntactic_eq(5 + x)
+
+
+def test_closed_interval_replace():
+    i = BasicVariable('i', int)
+    x = BasicVariable('x', int)
+    y = BasicVariable('y', int)
+    one = Z3Expression.new_constant(1)
+    interval = ClosedInterval(one, Z3Expression.convert(x + 1))
+
+    replaced = interval.replace(x, y)
+    assert replaced.lower_bound.syntactic_eq(one)
+    assert replaced.upper_bound.syntactic_eq(y + 1)
+
+    # nothing to replace: returns self
+    constant_interval = ClosedInterval(one, Z3Expression.new_constant(4))
+    assert constant_interval.replace(i, y) is constant_interval
+    assert constant_interval.internal_object_eq(ClosedInterval(one, Z3Expression.new_constant(4)))
+    assert not constant_interval.internal_object_eq(replaced)
+
+    dotted_intervals = DottedIntervals(interval, [])
+    assert dotted_intervals.replace(x, y).interval.upper_bound.syntactic_eq(y + 1)
+    # built from fresh bound objects, so this is not the same (interned) instance
+    other_dotted_intervals = DottedIntervals(ClosedInterval(Z3Expression.new_constant(1), Z3Expression.convert(x + 1)), [])
+    assert other_dotted_intervals is not dotted_intervals
+    assert dotted_intervals.internal_object_eq(other_dotted_intervals)
+    assert not dotted_intervals.internal_object_eq(DottedIntervals(ClosedInterval(one, Z3Expression.convert(y)), []))
+
+
+def test_duplicate_bounds():
+    i = BasicVariable('i', int)
+    x = BasicVariable('x', int)
+
+    empty_context = Z3SolverExpression()
+    constant_context = empty_context & (i >= x + 1) & (i > x) & (i <= 4)
+
+    dotted_interval = from_constraint(i, constant_context, empty_context, False)
+    interval = dotted_interval.interval
+
+    assert interval.lower_bound.syntactic_eq(1 + x)
+    assert interval.upper_bound.syntactic_eq(Z3Expression.new_constant(4))
+
+
+def test_numeric_bounds_are_folded():
+    i = BasicVariable('i', int)
+    x = BasicVariable('x', int)
+
+    empty_context = Z3SolverExpression()
+    constant_context = empty_context & (i >= 2) & (i > 0) & (i < 9) & (i <= 4) & (i <= x)
+
+    dotted_interval = from_constraint(i, constant_context, empty_context, False)
+    interval = dotted_interval.interval
+
+    assert interval.lower_bound.syntactic_eq(Z3Expression.new_constant(2))
+    assert interval.upper_bound.syntactic_eq(min_([x, Z3Expression.new_constant(4)]))
+
+
+def test_to_context():
+    i = BasicVariable('i', int)
+    x = BasicVariable('x', int)
+
+    context = ClosedInterval(Z3Expression.new_constant(1), Z3Expression.convert(x)).to_context(i)
+    assert context.is_known_to_imply(i >= 1)
+    assert context.is_known_to_imply(i <= x)
+    assert not context.is_known_to_imply(i >= 2)
+
+    # contexts do not leak into each other
+    other_context = ClosedInterval(Z3Expression.new_constant(3), Z3Expression.new_constant(5)).to_context(i)
+    assert other_context.is_known_to_imply(i >= 3)
+    assert not context.is_known_to_imply(i >= 3)
+
+
+def test_intervals_are_interned():
+    one = Z3Expression.new_constant(1)
+    four = Z3Expression.new_constant(4)
+    interval = ClosedInterval(one, four)
+    assert ClosedInterval(one, four) is interval
+    assert ClosedInterval(one, Z3Expression.new_constant(4)) is not interval
+    assert ClosedInterval(one, Z3Expression.new_constant(4)).internal_object_eq(interval)
+    assert DottedIntervals(interval, []) is DottedIntervals(interval, [])
+
+    # the dots of a pooled instance cannot be changed through the list it was built from
+    dots = [one]
+    dotted_intervals = DottedIntervals(interval, dots)
+    dots.append(four)
+    assert len(dotted_intervals.dots) == 1
+
+
+def test_internal_object_eq_requires_same_backend():
+    z3_interval = ClosedInterval(Z3Expression.new_constant(1), Z3Expression.new_constant(4))
+    sympy_interval = ClosedInterval(SymPyExpression.new_constant(1), SymPyExpression.new_constant(4))
+    assert not z3_interval.internal_object_eq(sympy_interval)
+    assert not sympy_interval.internal_object_eq(z3_interval)
+    assert sympy_interval.internal_object_eq(
+        ClosedInterval(SymPyExpression.new_constant(1), SymPyExpression.new_constant(4)))
+    # replace() relies on internal_object_eq, so it must not substitute across backends either
+    assert z3_interval.replace(sympy_interval, Z3Expression.new_constant(0)) is z3_interval
+
+
+def test_copy_intervals():
+    x = Z3Expression.convert(BasicVariable('x', int))
+    interval = ClosedInterval(Z3Expression.new_constant(1), x)
+    dotted_intervals = DottedIntervals(interval, [x])
+    for copy_function in [copy.copy, copy.deepcopy]:
+        assert copy_function(interval).internal_object_eq(interval)
+        assert copy_function(dotted_intervals).internal_object_eq(dotted_intervals)
+
+    # z3 objects cannot be pickled, so pickling is checked with sympy bounds
+    interval = ClosedInterval(SymPyExpression.new_constant(1), SymPyExpression.new_constant(4))
+    dotted_intervals = pickle.loads(pickle.dumps(DottedIntervals(interval, [])))
+    assert dotted_intervals.internal_object_eq(DottedIntervals(interval, []))
+    assert list(dotted_intervals.interval) == [1, 2, 3, 4]
+
+
+def test_size():
+    interval = ClosedInterval(Z3Expression.new_constant(1), Z3Expression.new_constant(4))
+    assert interval.size.syntactic_eq(Z3Expression.new_constant(4))
+    assert interval.size is interval.size
+
+    with pytest.raises(AttributeError):
+        ClosedInterval(Z3Expression.new_constant(4), Z3Expression.new_constant(1)).size
+
+
+def test_iter():
+    interval = ClosedInterval(Z3Expression.new_constant(1), Z3Expression.new_constant(4))
+    assert list(interval) == [1, 2, 3, 4]
+
+    x = BasicVariable('x', int)
+    with pytest.raises(TypeError):
+        iter(ClosedInterval(Z3Expression.new_constant(1), Z3Expression.convert(x)))
+
+
+def test_replace_shared_bound():
+    x = Z3Expression.convert(BasicVariable('x', int))
+    y = BasicVariable('y', int)
+    replaced = ClosedInterval(x, x).replace(x, y)
+    assert replaced.lower_bound is replaced.upper_bound
+    assert replaced.lower_bound.syntactic_eq(y)
+
+
+def test_constant_interval_fast_paths():
+    x = BasicVariable('x', int)
+    one = Z3Expression.new_constant(1)
+    interval = ClosedInterval(one, Z3Expression.new_constant(4))
+    assert interval.replace(x, one) is interval
+    assert interval.internal_object_eq(ClosedInterval(Z3Expression.new_constant(1), Z3Expression.new_constant(4)))
+    assert not interval.internal_object_eq(ClosedInterval(one, Z3Expression.new_constant(5)))
+
+    # constants can still be replaced
+    replaced = interval.replace(one, Z3Expression.new_constant(2))
+    assert replaced.lower_bound.syntactic_eq(Z3Expression.new_constant(2))
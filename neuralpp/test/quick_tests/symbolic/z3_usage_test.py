@@ -7,6 +7,8 @@ from z3 import Solver, Not, sat, unsat, Int, Implies, Or, simplify, Ints, And, R
     ForAll, Exists, ExprRef, Sum, Context, Array, BoolSort, Goal, Tactic
 from copy import copy
 
+_solver = Solver()
+
 
 def is_valid(predicate: ExprRef) -> bool:
     """
@@ -15,10 +17,15 @@ def is_valid(predicate: ExprRef) -> bool:
     If `not PRED` is sat, then PRED is NOT always true, since there must exist a counter-example that satisfies
     `not PRED`, which we can get by calling s.model().
     If `not PRED` is unsat, then PRED is always true.
+    A single solver is reused across calls instead of creating a new Solver() each time:
+    push() and pop() scope the assertion to this call, while the solver keeps what it learned.
     """
-    s = Solver()
-    s.add(Not(predicate))
-    return s.check() == unsat
+    _solver.push()
+    try:
+        _solver.add(Not(predicate))
+        return _solver.check() == unsat
+    finally:
+        _solver.pop()
 
 
 def test_is_valid():
@@ -97,9 +104,12 @@ def test_sum():
     # we can only do this when n is static to Z3.
     # We cannot state something like "forall n, 1 + 2 + ... n = (1 + n) * n / 2"
     N = 1000
-    assert (is_valid(Sum([j for j in range(N + 1)]) == (1 + N) * N / 2))
+    # Computing the closed form as a Python int (// instead of /) keeps the query in integer arithmetic;
+    # `/ 2` would be a Python float, i.e., a z3 real that every summand must be coerced to.
+    gauss_sum = (1 + N) * N // 2
+    assert (is_valid(Sum([j for j in range(N + 1)]) == gauss_sum))
     assert (is_valid(Sum([x for _ in range(N + 1)]) == (1 + N) * x))
-    assert (is_valid(Sum([x + j for j in range(N + 1)]) == (1 + N) * x + (1 + N) * N / 2))
+    assert (is_valid(Sum([x + j for j in range(N + 1)]) == (1 + N) * x + gauss_sum))
 
 
 def test_z3_solver():